@@ -2,89 +2,93 @@
 from __future__ import annotations
 
 import datetime
+import functools
+import importlib.util
+import itertools
+import math
 import os
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-
-try:
-    from zoneinfo import ZoneInfo
-except ImportError:
-    from backports.zoneinfo import ZoneInfo
+from typing import Any
 
 import pandas as pd
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader, Template
 
-from cbsserverbilling.policy import BillingPolicy, get_end_of_period
+from cbsserverbilling.policy import BILL_TEMPLATE, BillingPolicy, get_bill_date
 from cbsserverbilling.records import BillableProjectRecord
 
-TIME_ZONE = ZoneInfo("America/Toronto")
-
-env = Environment(
-    loader=PackageLoader("cbsserverbilling", "templates"),
-    autoescape=True,
+EXCEL_WRITER_ENGINE = (
+    "xlsxwriter" if importlib.util.find_spec("xlsxwriter") else "openpyxl"
 )
 
 
+@functools.lru_cache(maxsize=None)
+def get_bill_template() -> Template:
+    """Load the bill template, compiling it only on first use."""
+    env = Environment(
+        loader=PackageLoader("cbsserverbilling", "templates"),
+        autoescape=True,
+        # The default cache directory is private to the current user
+        bytecode_cache=FileSystemBytecodeCache(pattern="cbsserverbilling_%s.cache"),
+    )
+    return env.get_template(BILL_TEMPLATE)
+
+
 def summarize_all_pi_bills(
     all_records: Iterable[BillableProjectRecord],
     quarter_start: datetime.date,
     out_file: os.PathLike,
 ) -> None:
-    """Print a summary of all PI bills."""
+    """Print a summary of all PI bills.
+
+    The summary table is saved to `out_file`, as a CSV file if its suffix is
+    ".csv" and as an Excel workbook otherwise.
+    """
     policy = BillingPolicy()
-    quarter_end = get_end_of_period(
-        quarter_start.year,
-        quarter_start.month,
-        policy.PERIOD_LENGTH,
+    quarter_end = policy.get_period(quarter_start).end
+    records = sorted(
+        policy.filter_billable_pis(all_records, quarter_start),
+        key=lambda record: record.get_pi_last_name(),
     )
-    records = [
-        record for record in all_records if policy.is_billable_pi(record, quarter_start)
-    ]
 
-    pd.DataFrame(
-        {
-            "pi": [record.get_pi_last_name() for record in records],
-            "email": [record.get_pi_email() for record in records],
-            "storage_amount": [
-                policy.get_quarterly_storage_amount(record, quarter_start)
-                for record in records
-            ],
-            "storage_price": [
-                policy.get_quarterly_storage_price(record, quarter_start)
-                for record in records
-            ],
-            "billed_power_users": [
-                len(
-                    [
-                        user
-                        for user, price in policy.enumerate_quarterly_power_user_prices(
-                            record,
-                            quarter_start,
-                        )
-                        if price > 0
-                    ],
-                )
-                for record in records
-            ],
-            "compute_price": [
-                policy.get_quarterly_power_user_price(record, quarter_start)
-                for record in records
-            ],
-            "total_price": [
-                policy.get_quarterly_total_price(record, quarter_start)
-                for record in records
-            ],
-            "speed_code": [record.get_speed_code(quarter_end) for record in records],
-        },
-    ).sort_values(by="pi").to_excel(out_file, index=False, engine="openpyxl")
-
-    total_storage = sum(
-        policy.get_quarterly_storage_price(record, quarter_start) for record in records
+    summary_df = pd.DataFrame.from_records(
+        [
+            summarize_pi_bill(policy, record, quarter_start, quarter_end)
+            for record in records
+        ],
+        columns=[
+            "pi",
+            "email",
+            "storage_amount",
+            "storage_price",
+            "billed_power_users",
+            "compute_price",
+            "total_price",
+            "speed_code",
+        ],
     )
-    total_compute = sum(
-        policy.get_quarterly_power_user_price(record, quarter_start)
-        for record in records
+    storage_amount = pd.Series(
+        policy.get_quarterly_storage_amounts(records, quarter_start),
+        dtype=float,
     )
+    storage_price = policy.price_quarterly_storage(storage_amount)
+    summary_df = summary_df.assign(
+        storage_amount=storage_amount,
+        storage_price=storage_price,
+        total_price=storage_price + summary_df["compute_price"],
+    )
+    if Path(out_file).suffix == ".csv":
+        summary_df.to_csv(out_file, index=False)
+    else:
+        summary_df.to_excel(
+            out_file,
+            index=False,
+            engine=EXCEL_WRITER_ENGINE,
+        )
+
+    total_storage = summary_df["storage_price"].sum()
+    total_compute = summary_df["compute_price"].sum()
     total = total_storage + total_compute
 
     print(f"Total (Storage): {total_storage}")
@@ -95,28 +99,84 @@ def summarize_all_pi_bills(
     print(f"Mean (Overall): {total / len(records)}")
 
 
+def summarize_pi_bill(
+    policy: BillingPolicy,
+    record: BillableProjectRecord,
+    quarter_start: datetime.date,
+    quarter_end: datetime.date,
+) -> dict[str, Any]:
+    """Summarize the account details and power users on one PI's bill.
+
+    Storage and the total price are left for the caller to work out for all PIs
+    at once.
+    """
+    power_user_prices = [
+        price
+        for _, price in policy.enumerate_quarterly_power_user_prices(
+            record,
+            quarter_start,
+        )
+    ]
+    return {
+        "pi": record.get_pi_last_name(),
+        "email": record.get_pi_email(),
+        "billed_power_users": len([price for price in power_user_prices if price > 0]),
+        "compute_price": math.fsum(power_user_prices),
+        "speed_code": record.get_speed_code(quarter_end),
+    }
+
+
 def generate_all_pi_bills(
     all_records: Iterable[BillableProjectRecord],
     quarter_start: datetime.date,
     out_dir: os.PathLike[str] | str,
+    max_workers: int | None = 1,
 ) -> None:
-    """Loop through all PIs and save a bill for each."""
-    policy = BillingPolicy()
-    records = [
-        record for record in all_records if policy.is_billable_pi(record, quarter_start)
-    ]
+    """Loop through all PIs and save a bill for each.
 
-    for record in records:
-        out_file = Path(out_dir) / (
+    Each bill is independent of the others, so if `max_workers` isn't 1, the bills
+    are generated in a pool of that many processes (or one per CPU if it's None).
+    """
+    policy = BillingPolicy()
+    records = policy.filter_billable_pis(all_records, quarter_start)
+    # Every bill in the batch is dated the same, even if it runs past midnight
+    bill_date = get_bill_date()
+    out_files = [
+        Path(out_dir)
+        / (
             f"pi-{record.get_pi_last_name()}"
             f"_started-{record.get_storage_start().isoformat()}"
             f"_quarter-{quarter_start.isoformat()}"
             "_bill.tex"
         )
-        generate_pi_bill(
-            record,
-            quarter_start,
-            out_file,
+        for record in records
+    ]
+
+    if max_workers == 1:
+        for record, out_file in zip(records, out_files):
+            write_pi_bill(
+                policy,
+                record,
+                quarter_start,
+                out_file,
+                bill_date,
+            )
+        return
+
+    # Each record only holds its own PI's data, so it is shipped with its task;
+    # batching tasks keeps the per-task pickling overhead down.
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        list(
+            executor.map(
+                write_pi_bill,
+                itertools.repeat(policy),
+                records,
+                itertools.repeat(quarter_start),
+                out_files,
+                itertools.repeat(bill_date),
+                chunksize=max(1, len(records) // (4 * workers)),
+            ),
         )
 
 
@@ -134,14 +194,23 @@ def generate_pi_bill(
     if not policy.is_billable_pi(record, quarter_start):
         return
 
+    write_pi_bill(policy, record, quarter_start, out_file)
+
+
+def write_pi_bill(
+    policy: BillingPolicy,
+    record: BillableProjectRecord,
+    quarter_start: datetime.date,
+    out_file: os.PathLike | None = None,
+    bill_date: datetime.date | None = None,
+) -> None:
+    """Produce a report for one PI already known to be billable this quarter."""
     if record.get_pi_last_name() == "Butler":
         print(record.get_storage_amount(quarter_start))
 
-    bill_tex = policy.generate_quarterly_bill_tex(
-        record,
-        quarter_start,
-        env,
+    bill_tex = get_bill_template().stream(
+        **policy.gen_quarterly_bill_context(record, quarter_start, bill_date),
     )
     if out_file is not None:
         with Path(out_file).open("w", encoding="utf-8") as writable:
-            writable.write(bill_tex)
+            bill_tex.dump(writable)
@@ -2,20 +2,56 @@
 
 from __future__ import annotations
 
+import bisect
 import calendar
 import datetime
+import functools
+import itertools
+from collections.abc import Iterable
+from typing import Generic, TypeVar
 
+from attrs import define
 
+
+@functools.lru_cache(maxsize=None)
 def get_days_in_range(
     start_date: datetime.date, end_date: datetime.date,
-) -> list[datetime.date]:
-    """Return an (inclusive) list of days between the given dates."""
-    return [
-        start_date + datetime.timedelta(days=delta)
-        for delta in range((end_date - start_date).days + 1)
-    ]
+) -> tuple[datetime.date, ...]:
+    """Return an (inclusive) tuple of days between the given dates.
+
+    Every record asks for the days in the same billing period, so the result is
+    memoized and returned as an immutable tuple.
+    """
+    return tuple(
+        map(
+            datetime.date.fromordinal,
+            range(start_date.toordinal(), end_date.toordinal() + 1),
+        ),
+    )
+
+
+def count_days_in_ranges(
+    ranges: Iterable[tuple[datetime.date, datetime.date]],
+) -> int:
+    """Count the days covered by any of several (inclusive) date ranges.
+
+    Days covered by more than one range are only counted once.
+    """
+    num_days = 0
+    covered_until = datetime.date.min
+    for first, last in sorted(ranges):
+        start = max(first, covered_until + datetime.timedelta(days=1))
+        if start <= last:
+            num_days += (last - start).days + 1
+            covered_until = last
+    return num_days
 
 
+# Days in each month of a non-leap year
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+@functools.lru_cache(maxsize=None)
 def get_end_of_period(
     start_year: int,
     start_month: int,
@@ -23,6 +59,9 @@ def get_end_of_period(
 ) -> datetime.date:
     """Return the end date of a period starting in a given month.
 
+    Results are memoized, since the same few periods are looked up repeatedly while
+    billing.
+
     Parameters
     ----------
     start_year : int
@@ -37,20 +76,86 @@ def get_end_of_period(
     date
         Last day of the period.
     """
+    # Count months from year 0 so that wrapping into later years is just divmod
     months_in_year = 12
-    year = start_year
-    if num_months >= months_in_year:
-        year += num_months // months_in_year
-        num_months = num_months % months_in_year
-
-    if (not num_months) and start_month == 1:
-        year -= 1
-        month = 12
-    elif start_month <= (13 - num_months):
-        year = start_year
-        month = start_month + (num_months - 1)
-    else:
-        year = start_year + 1
-        month = start_month - (13 - num_months)
-
-    return datetime.date(year, month, calendar.monthrange(year, month)[-1])
+    year, month_idx = divmod(
+        start_year * months_in_year + (start_month - 1) + (num_months - 1),
+        months_in_year,
+    )
+    month = month_idx + 1
+
+    last_day = DAYS_IN_MONTH[month_idx] + (month == 2 and calendar.isleap(year))
+    return datetime.date(year, month, last_day)
+
+
+MONTH_ABBREVIATIONS = (
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+)
+
+
+def format_date(date: datetime.date) -> str:
+    """Format a date like "Jan 01, 2021".
+
+    This matches `date.strftime("%b %d, %Y")` in the C locale, but skips
+    strftime's format parsing and doesn't depend on the locale.
+    """
+    return f"{MONTH_ABBREVIATIONS[date.month - 1]} {date.day:02d}, {date.year}"
+
+
+T = TypeVar("T")
+
+
+@define(frozen=True)
+class Timeline(Generic[T]):
+    """Sorted history of a value that changes on particular dates."""
+
+    dates: tuple[datetime.date, ...]
+    values: tuple[T, ...]
+
+    @classmethod
+    def from_changes(
+        cls,
+        changes: Iterable[tuple[datetime.date, T | None]],
+    ) -> Timeline[T]:
+        """Build a timeline from (date, value) pairs, skipping unset values.
+
+        If there are several values on one date, the first one is kept.
+        """
+        by_date: dict[datetime.date, T] = {}
+        for date, value in changes:
+            if value is not None and date not in by_date:
+                by_date[date] = value
+        dates = tuple(sorted(by_date))
+        return cls(dates=dates, values=tuple(by_date[date] for date in dates))
+
+    @classmethod
+    def from_increments(
+        cls,
+        changes: Iterable[tuple[datetime.date, float | None]],
+    ) -> Timeline[float]:
+        """Build a running total from (date, increment) pairs, skipping unset ones."""
+        by_date: dict[datetime.date, float] = {}
+        for date, increment in changes:
+            if increment:
+                by_date[date] = by_date.get(date, 0) + increment
+        dates = tuple(sorted(by_date))
+        return cls(
+            dates=dates,
+            values=tuple(itertools.accumulate(by_date[date] for date in dates)),
+        )
+
+    def get(self, date: datetime.date) -> T | None:
+        """Get the most recent value set on or before a date, if any."""
+        idx = bisect.bisect_right(self.dates, date)
+        return self.values[idx - 1] if idx else None
@@ -4,11 +4,12 @@ from __future__ import annotations
 
 import argparse
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from os import PathLike
 from pathlib import Path
+from typing import Literal
 
 from cbsserverbilling.billing import generate_all_pi_bills, summarize_all_pi_bills
-from cbsserverbilling.dateutils import get_end_of_period
 from cbsserverbilling.policy import BillingPolicy
 from cbsserverbilling.spreadsheet.io import (
     load_pi_df,
@@ -19,6 +20,15 @@ from cbsserverbilling.spreadsheet.io import (
 from cbsserverbilling.spreadsheet.record import gen_all_project_records
 
 
+def non_negative_int(value: str) -> int:
+    """Parse a command-line argument as an integer of at least 0."""
+    number = int(value)
+    if number < 0:
+        msg = f"{value} is less than 0"
+        raise argparse.ArgumentTypeError(msg)
+    return number
+
+
 def gen_parser() -> argparse.ArgumentParser:
     """Generate a command-line parser."""
     parser = argparse.ArgumentParser(description="Process CBS Server billing data.")
@@ -40,14 +50,26 @@ def gen_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         "quarter_start",
-        type=str,
-        help="First day of the quarter to bill",
+        type=datetime.date.fromisoformat,
+        help="First day of the quarter to bill, in ISO format",
     )
     parser.add_argument(
         "out_dir",
         type=str,
         help="Directory into which to output bill files",
     )
+    parser.add_argument(
+        "--jobs",
+        type=non_negative_int,
+        default=1,
+        help="Number of processes to use to generate bills (0 for one per CPU)",
+    )
+    parser.add_argument(
+        "--summary-format",
+        choices=["xlsx", "csv"],
+        default="xlsx",
+        help="File format in which to save the bill summary",
+    )
 
     return parser
 
@@ -57,36 +79,39 @@ def process_everything(  # noqa: PLR0913
     user_form: PathLike[str] | str,
     user_update_form: PathLike[str] | str,
     pi_update_form: PathLike[str] | str,
-    quarter_start_iso: str,
+    quarter_start: datetime.date,
     out_dir: PathLike[str] | str,
+    jobs: int = 1,
+    summary_format: Literal["csv", "xlsx"] = "xlsx",
 ) -> None:
     """Generate all bills and a summary."""
-    pi_df = load_pi_df(pi_form)
-    user_df = load_user_df(user_form)
-    user_update_df = load_user_update_df(user_update_form)
-    pi_update_df = load_storage_update_df(pi_update_form)
+    # The forms are independent, so their parsing can overlap
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pi_future = executor.submit(load_pi_df, pi_form)
+        user_future = executor.submit(load_user_df, user_form)
+        user_update_future = executor.submit(load_user_update_df, user_update_form)
+        pi_update_future = executor.submit(load_storage_update_df, pi_update_form)
+    pi_df = pi_future.result()
+    user_df = user_future.result()
+    user_update_df = user_update_future.result()
+    pi_update_df = pi_update_future.result()
 
     policy = BillingPolicy()
-    start_date = datetime.date.fromisoformat(quarter_start_iso)
-    end_date = get_end_of_period(
-        start_date.year,
-        start_date.month,
-        policy.PERIOD_LENGTH,
-    )
+    end_date = policy.get_period(quarter_start).end
     records = gen_all_project_records(
         user_df,
         user_update_df,
         pi_df,
         pi_update_df,
-        start_date,
+        quarter_start,
         end_date,
     )
     summarize_all_pi_bills(
         records,
-        start_date,
-        Path(out_dir) / f"summary_{quarter_start_iso}.xlsx",
+        quarter_start,
+        Path(out_dir) / f"summary_{quarter_start.isoformat()}.{summary_format}",
     )
-    generate_all_pi_bills(records, start_date, out_dir)
+    generate_all_pi_bills(records, quarter_start, out_dir, max_workers=jobs or None)
 
 
 def main() -> None:
@@ -99,6 +124,8 @@ def main() -> None:
         args.pi_update_form,
         args.quarter_start,
         args.out_dir,
+        jobs=args.jobs,
+        summary_format=args.summary_format,
     )
 
 
@@ -3,29 +3,66 @@
 from __future__ import annotations
 
 import datetime
+import itertools
+import math
+from collections.abc import Iterable, Iterator
+from typing import Any, NamedTuple, overload
+
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
     from backports.zoneinfo import ZoneInfo
 
 import pandas as pd
-from jinja2 import Environment
-
-from cbsserverbilling.dateutils import get_days_in_range, get_end_of_period
+from attrs import define
+from jinja2 import Template
+
+from cbsserverbilling.dateutils import (
+    count_days_in_ranges,
+    format_date,
+    get_end_of_period,
+)
 from cbsserverbilling.records import BillableProjectRecord, User
 
-# Storage price in dollars/TB/year
-STORAGE_PRICE = 50
-
-# Power user prices in dollars/year
-FIRST_POWERUSER_PRICE = 1000
-ADDITIONAL_POWERUSER_PRICE = 500
-
 BILL_TEMPLATE = "cbs_server_bill.tex.jinja"
 
 TIME_ZONE = ZoneInfo("America/Toronto")
 
 
+def get_bill_date() -> datetime.date:
+    """Get today's date where the bills are issued."""
+    return datetime.datetime.now(tz=TIME_ZONE).date()
+
+
+@define(frozen=True)
+class BillingPeriod:
+    """Boundary dates of one billing period.
+
+    Attributes
+    ----------
+    start
+        First day of the period.
+    end
+        Last day of the period.
+    start_cutoff
+        Last day on which usage can start and still be billed for the period.
+    end_cutoff
+        Last day on which usage can end and not be billed for the period.
+    """
+
+    start: datetime.date
+    end: datetime.date
+    start_cutoff: datetime.date
+    end_cutoff: datetime.date
+
+
+class PowerUserPrice(NamedTuple):
+    """A power user's terms in a billing period, and what they're charged for it."""
+
+    terms: list[User]
+    price: float
+
+
 class BillingPolicy:
     """Class containing all billing policy information.
 
@@ -33,13 +70,42 @@ class BillingPolicy:
     and uses it to generate bill TeX files from a template.
     """
 
+    # Storage price in dollars/TB/year
     STORAGE_PRICE = 50
+    # Power user prices in dollars/year
     FIRST_POWER_USER_PRICE = 1000
     ADDITIONAL_POWER_USER_PRICE = 500
 
     PERIOD_LENGTH = 3
     MIN_BILL_USAGE = 2
 
+    def get_period(self, start_date: datetime.date) -> BillingPeriod:
+        """Work out the boundary dates of the period starting on a date.
+
+        Parameters
+        ----------
+        start_date : date
+            Date in the first month of the period.
+        """
+        return BillingPeriod(
+            start=start_date,
+            end=get_end_of_period(
+                start_date.year,
+                start_date.month,
+                self.PERIOD_LENGTH,
+            ),
+            start_cutoff=get_end_of_period(
+                start_date.year,
+                start_date.month,
+                self.PERIOD_LENGTH - self.MIN_BILL_USAGE,
+            ),
+            end_cutoff=get_end_of_period(
+                start_date.year,
+                start_date.month,
+                self.MIN_BILL_USAGE,
+            ),
+        )
+
     def is_billable_pi(
         self,
         record: BillableProjectRecord,
@@ -63,26 +129,40 @@ class BillingPolicy:
         bool
             True if the billable project is billable in the specified period.
         """
-        end_date = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.PERIOD_LENGTH,
-        )
-        if record.get_storage_start() > end_date:
-            return False
-        cutoff_date = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.MIN_BILL_USAGE,
-        )
-        account_close_date = record.get_close_date()
-        if (
-            pd.isna(account_close_date)
-            or (not account_close_date)
-            or (account_close_date > cutoff_date)
-        ):
-            return True
-        return False
+        return bool(self.filter_billable_pis([record], start_date))
+
+    def filter_billable_pis(
+        self,
+        records: Iterable[BillableProjectRecord],
+        start_date: datetime.date,
+    ) -> list[BillableProjectRecord]:
+        """Select the billable projects that are billable in this quarter.
+
+        This applies the same rules as `is_billable_pi`, but only works out the
+        period boundaries once for the whole batch of records.
+
+        Parameters
+        ----------
+        records
+            Records with all the storage information.
+        start_date : date
+            Date in the first month of the quarter.
+
+        Returns
+        -------
+        list of BillableProjectRecord
+            The records billable in the specified period, in their original order.
+        """
+        period = self.get_period(start_date)
+        return [
+            record
+            for record in records
+            if record.get_storage_start() <= period.end
+            and (
+                (account_close_date := record.get_close_date()) is None
+                or (account_close_date > period.end_cutoff)
+            )
+        ]
 
     def get_quarterly_storage_amount(
         self,
@@ -103,23 +183,46 @@ class BillingPolicy:
         float
             Total storage used by the billable project in this quarter
         """
-        cutoff_date = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.PERIOD_LENGTH - self.MIN_BILL_USAGE,
-        )
-        if record.get_storage_start() > cutoff_date:
-            return 0
-        return min(
-            record.get_storage_amount(cutoff_date),
-            record.get_storage_amount(
-                get_end_of_period(
-                    start_date.year,
-                    start_date.month,
-                    self.MIN_BILL_USAGE,
-                ),
-            ),
-        )
+        return self.get_quarterly_storage_amounts([record], start_date)[0]
+
+    def get_quarterly_storage_amounts(
+        self,
+        records: Iterable[BillableProjectRecord],
+        start_date: datetime.date,
+    ) -> list[float]:
+        """Calculate a quarter's storage usage for several billable projects.
+
+        This applies the same rules as `get_quarterly_storage_amount`, but only works
+        out the period boundaries once for the whole batch of records. Projects
+        closed too early in the quarter to be billable don't look up their storage.
+
+        Parameters
+        ----------
+        records
+            Records with all the storage information.
+        start_date : date
+            Date in the first month of the quarter.
+
+        Returns
+        -------
+        list of float
+            Total storage used by each billable project in this quarter, in the
+            records' order.
+        """
+        period = self.get_period(start_date)
+        return [
+            0
+            if record.get_storage_start() > period.start_cutoff
+            or (
+                (account_close_date := record.get_close_date()) is not None
+                and account_close_date <= period.end_cutoff
+            )
+            else min(
+                record.get_storage_amount(period.start_cutoff),
+                record.get_storage_amount(period.end_cutoff),
+            )
+            for record in records
+        ]
 
     def get_quarterly_storage_price(
         self,
@@ -140,17 +243,31 @@ class BillingPolicy:
         float
             Total storage price for the billable project for the quarter.
         """
-        return (
-            self.get_quarterly_storage_amount(record, start_date)
-            * self.STORAGE_PRICE
-            * 0.25
+        return self.price_quarterly_storage(
+            self.get_quarterly_storage_amount(record, start_date),
         )
 
+    @overload
+    def price_quarterly_storage(self, amount: float) -> float:
+        ...
+
+    @overload
+    def price_quarterly_storage(self, amount: pd.Series) -> pd.Series:
+        ...
+
+    def price_quarterly_storage(self, amount: float | pd.Series) -> float | pd.Series:
+        """Calculate the price of storing an amount of data for a quarter.
+
+        This only uses arithmetic, so `amount` can also be a whole column of
+        amounts.
+        """
+        return amount * self.STORAGE_PRICE * 0.25
+
     def enumerate_quarterly_power_user_prices(
         self,
         record: BillableProjectRecord,
         start_date: datetime.date,
-    ) -> list[tuple[list[User], float]]:
+    ) -> list[PowerUserPrice]:
         """Calculate the price each of one billable project's power users in a quarter.
 
         Parameters
@@ -162,48 +279,51 @@ class BillingPolicy:
 
         Returns
         -------
-        list of tuple
-            A tuple for each of the billable project's power users, including the user's
-            name, start date, end date, and price.
+        list of PowerUserPrice
+            The terms and price of each of the billable project's power users.
         """
-        end_date = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.PERIOD_LENGTH,
-        )
-        end_cutoff = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.MIN_BILL_USAGE,
-        )
-        start_cutoff = get_end_of_period(
-            start_date.year,
-            start_date.month,
-            self.PERIOD_LENGTH - self.MIN_BILL_USAGE,
+        return list(self._iter_quarterly_power_user_prices(record, start_date))
+
+    def _iter_quarterly_power_user_prices(
+        self,
+        record: BillableProjectRecord,
+        start_date: datetime.date,
+    ) -> Iterator[PowerUserPrice]:
+        """Generate the price of each of one billable project's power users in turn.
+
+        Parameters
+        ----------
+        record
+            Record with all the storage information.
+        start_date
+            Date in the first month of the quarter.
+
+        Yields
+        ------
+        PowerUserPrice
+            The terms and price of each of the billable project's power users.
+        """
+        period = self.get_period(start_date)
+        min_days = max(
+            (period.end_cutoff - start_date).days,
+            (period.end - period.start_cutoff).days,
         )
-        min_days = max((end_cutoff - start_date).days, (end_date - start_cutoff).days)
-        power_users = record.enumerate_power_users(start_date, end_date)
+        power_users = record.enumerate_power_users(start_date, period.end)
+
+        # Grouping the start-sorted terms by email leaves each user's terms in order,
+        # and the users themselves ordered by their earliest term.
+        terms_by_email: dict[str, list[User]] = {}
+        for user in sorted(power_users, key=lambda user: user.start_date):
+            terms_by_email.setdefault(user.email, []).append(user)
 
-        price_record = []
         first_price_applied = False
-        period_days = get_days_in_range(start_date, end_date)
-        for terms in sorted(
-            [
-                [user for user in power_users if user.email == email]
-                for email in {user.email for user in power_users}
-            ],
-            key=lambda terms: min(terms, key=lambda user: user.start_date).start_date,
-        ):
-            active_days = {
-                date for date in period_days for term in terms if term.is_active(date)
-            }
-            power_user_days = {
-                date
-                for date in active_days
-                for term in terms
-                if term.is_active(date) and term.is_power_user(date)
-            }
-            charge = len(power_user_days) >= min_days
+        for terms in terms_by_email.values():
+            power_user_days = count_days_in_ranges(
+                itertools.chain.from_iterable(
+                    term.get_power_user_ranges(start_date, period.end) for term in terms
+                ),
+            )
+            charge = power_user_days >= min_days
             if not charge:
                 price = 0.0
             elif not first_price_applied:
@@ -211,11 +331,7 @@ class BillingPolicy:
                 first_price_applied = True
             else:
                 price = self.ADDITIONAL_POWER_USER_PRICE * 0.25
-            price_record.append(
-                (sorted(terms, key=lambda term: term.start_date), price),
-            )
-
-        return price_record
+            yield PowerUserPrice(terms=terms, price=price)
 
     def get_quarterly_power_user_price(
         self,
@@ -236,12 +352,9 @@ class BillingPolicy:
         float
             Total power users price for the billable project for the quarter.
         """
-        return sum(
-            price
-            for _, price in self.enumerate_quarterly_power_user_prices(
-                record,
-                quarter_start,
-            )
+        return math.fsum(
+            row.price
+            for row in self._iter_quarterly_power_user_prices(record, quarter_start)
         )
 
     def get_quarterly_total_price(
@@ -272,7 +385,7 @@ class BillingPolicy:
         self,
         record: BillableProjectRecord,
         quarter_start: datetime.date,
-        env: Environment,
+        template: Template,
     ) -> str:
         """Generate tex file of a quarterly bill.
 
@@ -282,71 +395,70 @@ class BillingPolicy:
             Record with all the storage information.
         quarter_start
             Date in the first month of the quarter.
-        env
-            jinja2 environment
+        template
+            Compiled jinja2 bill template
         """
-        # pylint: disable=too-many-locals
-        pi_name = record.get_pi_full_name()
-        end_date = get_end_of_period(
-            quarter_start.year,
-            quarter_start.month,
-            self.PERIOD_LENGTH,
-        )
-        dates = {
-            "start": quarter_start.strftime("%b %d, %Y"),
-            "end": end_date.strftime("%b %d, %Y"),
-            "bill": datetime.datetime.now(tz=TIME_ZONE).strftime("%b %d, %Y"),
-        }
-        subtotal = self.get_quarterly_storage_price(record, quarter_start)
-        storage = {
-            "timestamp": (record.get_storage_start().strftime("%b %d, %Y")),
-            "amount": record.get_storage_amount(end_date),
-            "price": f"{STORAGE_PRICE:.2f}",
-            "subtotal": f"{subtotal:.2f}",
-        }
-        power_users = [
-            {
-                "last_name": users[0].name,
-                "start_date": [user.start_date.strftime("%b %d, %Y") for user in users],
-                "end_date": [
-                    "N/A"
-                    if (not user.end_date)
-                    else user.end_date.strftime("%b %d, %Y")
-                    for user in users
-                ],
-                "price": f"{price * 4:.2f}",
-                "subtotal": f"{price:.2f}",
-            }
-            for users, price in sorted(
-                self.enumerate_quarterly_power_user_prices(
-                    record,
-                    quarter_start,
-                ),
-                key=lambda tuple_: min(
-                    tuple_[0],
-                    key=lambda user: user.start_date,
-                ).start_date,
-            )
-        ]
-        power_users_subtotal = self.get_quarterly_power_user_price(
-            record,
-            quarter_start,
+        return template.render(
+            **self.gen_quarterly_bill_context(record, quarter_start),
         )
-        total = self.get_quarterly_total_price(
+
+    def gen_quarterly_bill_context(
+        self,
+        record: BillableProjectRecord,
+        quarter_start: datetime.date,
+        bill_date: datetime.date | None = None,
+    ) -> dict[str, Any]:
+        """Generate the values needed to fill in the quarterly bill template.
+
+        Parameters
+        ----------
+        record
+            Record with all the storage information.
+        quarter_start
+            Date in the first month of the quarter.
+        bill_date
+            Date the bill is issued on. Defaults to today.
+        """
+        pi_name = record.get_pi_full_name()
+        end_date = self.get_period(quarter_start).end
+        today = bill_date or get_bill_date()
+        storage_subtotal = self.get_quarterly_storage_price(record, quarter_start)
+        # Already ordered by each user's earliest term
+        power_user_prices = self.enumerate_quarterly_power_user_prices(
             record,
             quarter_start,
         )
-        total = f"{total:.2f}"
-        speed_code = record.get_speed_code(datetime.datetime.now(tz=TIME_ZONE).date())
-
-        template = env.get_template(BILL_TEMPLATE)
-        return template.render(
-            pi_name=pi_name,
-            pi_last_name=pi_name,
-            dates=dates,
-            storage=storage,
-            power_users=power_users,
-            power_users_subtotal=f"{power_users_subtotal:.2f}",
-            total=total,
-            speed_code=speed_code,
-        )
+        power_users_subtotal = math.fsum(price for _, price in power_user_prices)
+
+        # Everything is computed, so all that's left is formatting
+        return {
+            "pi_name": pi_name,
+            "pi_last_name": pi_name,
+            "dates": {
+                "start": format_date(quarter_start),
+                "end": format_date(end_date),
+                "bill": format_date(today),
+            },
+            "storage": {
+                "timestamp": format_date(record.get_storage_start()),
+                "amount": record.get_storage_amount(end_date),
+                "price": f"{self.STORAGE_PRICE:.2f}",
+                "subtotal": f"{storage_subtotal:.2f}",
+            },
+            "power_users": [
+                {
+                    "last_name": users[0].name,
+                    "start_date": [format_date(user.start_date) for user in users],
+                    "end_date": [
+                        format_date(user.end_date) if user.end_date else "N/A"
+                        for user in users
+                    ],
+                    "price": f"{price * 4:.2f}",
+                    "subtotal": f"{price:.2f}",
+                }
+                for users, price in power_user_prices
+            ],
+            "power_users_subtotal": f"{power_users_subtotal:.2f}",
+            "total": f"{storage_subtotal + power_users_subtotal:.2f}",
+            "speed_code": record.get_speed_code(today),
+        }
@@ -10,19 +10,12 @@ import datetime
 from abc import ABCMeta, abstractmethod
 from collections.abc import Iterable
 
-from attrs import Attribute, define, field
+from attrs import define
 
+from cbsserverbilling.dateutils import get_days_in_range
 
-def _check_dates(
-    instance: User,
-    _: Attribute[datetime.date | None],
-    value: datetime.date | None,
-) -> None:
-    if value and (value < instance.start_date):
-        raise UserDateRangeError(instance, instance.start_date, value)
 
-
-@define(frozen=True)
+@define(frozen=True, cache_hash=True)
 class User(metaclass=ABCMeta):
     """A user of the CBS Server."""
 
@@ -30,7 +23,12 @@ class User(metaclass=ABCMeta):
     name: str
     email: str
     start_date: datetime.date
-    end_date: datetime.date | None = field(default=None, validator=[_check_dates])
+    end_date: datetime.date | None = None
+
+    def __attrs_post_init__(self) -> None:
+        """Check that the user's dates are in order, unless running with -O."""
+        if __debug__ and self.end_date and (self.end_date < self.start_date):
+            raise UserDateRangeError(self, self.start_date, self.end_date)
 
     def is_active(self, date: datetime.date) -> bool:
         """Check if the user is active on a given date."""
@@ -42,6 +40,36 @@ class User(metaclass=ABCMeta):
     def is_power_user(self, date: datetime.date) -> bool:
         """Check whether a user was a power user on this date."""
 
+    def get_power_user_ranges(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> list[tuple[datetime.date, datetime.date]]:
+        """Find when in a range of dates the user was an active power user.
+
+        Parameters
+        ----------
+        start_date
+            First date to consider.
+        end_date
+            Last date to consider.
+
+        Returns
+        -------
+        list of tuple
+            The first and last dates (inclusive) of each stretch of days on which
+            the user was an active power user, in order.
+        """
+        ranges: list[tuple[datetime.date, datetime.date]] = []
+        for date in get_days_in_range(start_date, end_date):
+            if not (self.is_active(date) and self.is_power_user(date)):
+                continue
+            if ranges and ranges[-1][1] == date - datetime.timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], date)
+            else:
+                ranges.append((date, date))
+        return ranges
+
     @abstractmethod
     def get_pi_name(self, date: datetime.date) -> str:
         """Check a user's PI on this date."""
@@ -2,10 +2,199 @@
 
 from __future__ import annotations
 
+import datetime
+import functools
+import hashlib
+import importlib.util
 import os
+from collections.abc import Iterable
+from pathlib import Path
 
 import pandas as pd
 
+# pandas only gained its calamine engine in 2.2
+_PANDAS_VERSION = tuple(int(part) for part in pd.__version__.split(".")[:2])
+EXCEL_ENGINE = (
+    "calamine"
+    if importlib.util.find_spec("python_calamine") and _PANDAS_VERSION >= (2, 2)
+    else "openpyxl"
+)
+
+
+# The parsed forms hold names and emails, so they're only kept between runs if
+# this environment variable is set to a non-empty value
+DISK_CACHE_VARIABLE = "CBSSERVERBILLING_DISK_CACHE"
+MAX_CACHE_ENTRIES = 16
+
+
+def _get_cache_dir() -> Path | None:
+    """Find the directory in which to keep parsed forms, if there is one.
+
+    This follows the XDG base directory spec, so an empty `XDG_CACHE_HOME` is
+    treated as unset.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home:
+        return Path(cache_home) / "cbsserverbilling"
+    try:
+        return Path.home() / ".cache" / "cbsserverbilling"
+    except RuntimeError:
+        # Some containers have neither $HOME nor a passwd entry
+        return None
+
+
+def _is_private(path: Path) -> bool:
+    """Check that a path is owned by the current user and only they can write it."""
+    getuid = getattr(os, "getuid", None)
+    if getuid is None:
+        return False
+    path_stat = path.stat()
+    return path_stat.st_uid == getuid() and not path_stat.st_mode & 0o022
+
+
+def _load_cached_form(cache_file: Path) -> pd.DataFrame | None:
+    """Load a pickled form from the cache, if there's a trustworthy one."""
+    try:
+        if not (_is_private(cache_file.parent) and _is_private(cache_file)):
+            return None
+        # Nobody else can have written the pickle, so it's safe to load
+        form_df = pd.read_pickle(cache_file)  # noqa: S301
+    except Exception:  # noqa: BLE001
+        # Missing, stale, and corrupt pickles are all just cache misses
+        return None
+    return form_df if isinstance(form_df, pd.DataFrame) else None
+
+
+def _save_cached_form(cache_file: Path, form_df: pd.DataFrame) -> None:
+    """Pickle a form into the cache, dropping the least recently written ones."""
+    try:
+        cache_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _is_private(cache_file.parent):
+            return
+        # Write then rename, so a concurrent run never reads a partial pickle
+        partial_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        form_df.to_pickle(partial_file)
+        partial_file.replace(cache_file)
+        entries = sorted(
+            cache_file.parent.glob("*.pkl"),
+            key=lambda entry: entry.stat().st_mtime_ns,
+            reverse=True,
+        )
+        for entry in entries[MAX_CACHE_ENTRIES:]:
+            entry.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+@functools.lru_cache(maxsize=8)
+def _read_excel_cached(
+    form_path: str,
+    mtime_ns: int,
+    size: int,
+    headers: tuple[str, ...],
+    string_headers: tuple[str, ...],
+) -> pd.DataFrame:
+    """Read an excel sheet, reusing the result until the file is modified.
+
+    If the disk cache is enabled, parsed sheets are also pickled into the user's
+    cache directory, so later runs on unchanged forms can skip parsing them.
+    Callers must not modify the returned dataframe in place.
+    """
+    cache_dir = _get_cache_dir() if os.environ.get(DISK_CACHE_VARIABLE) else None
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.sha256(
+            repr(
+                (
+                    str(Path(form_path).resolve()),
+                    mtime_ns,
+                    size,
+                    headers,
+                    string_headers,
+                    EXCEL_ENGINE,
+                    pd.__version__,
+                ),
+            ).encode(),
+        ).hexdigest()
+        cache_file = cache_dir / f"{key}.pkl"
+        cached_df = _load_cached_form(cache_file)
+        if cached_df is not None:
+            return cached_df
+
+    form_df = pd.read_excel(
+        form_path,
+        engine=EXCEL_ENGINE,
+        usecols=list(headers),
+        dtype=dict.fromkeys(string_headers, "string"),
+    )
+    if cache_file is not None:
+        _save_cached_form(cache_file, form_df)
+    return form_df
+
+
+def read_form(
+    form_path: os.PathLike[str] | str,
+    columns: dict[str, str],
+    string_columns: Iterable[str] = (),
+) -> pd.DataFrame:
+    """Read the responses to a form from an excel sheet.
+
+    The Rust-backed calamine reader is much faster than openpyxl, so it's used
+    whenever python-calamine is installed, and each sheet is only parsed again
+    when it changes on disk. Only the columns in `columns` are parsed, and the
+    rest of the sheet is skipped or may be missing, so each loader only lists the
+    columns that are read downstream. Text columns are stripped and lowercased
+    with pandas' vectorized string methods.
+
+    Parameters
+    ----------
+    form_path
+        Path to the excel sheet containing the form responses.
+    columns
+        Mapping from the form's column headers to more usable column names.
+    string_columns
+        Renamed columns to read as strings rather than inferring their type.
+    """
+    headers = {column: header for header, column in columns.items()}
+    string_columns = list(string_columns)
+    form_path = os.fspath(form_path)
+    form_stat = Path(form_path).stat()
+    form_df = _read_excel_cached(
+        form_path,
+        form_stat.st_mtime_ns,
+        form_stat.st_size,
+        tuple(columns),
+        tuple(headers[column] for column in string_columns),
+    ).rename(columns=columns)
+    return form_df.assign(
+        **{
+            column: form_df[column].str.strip().str.lower() for column in string_columns
+        },
+    )
+
+
+def answered(responses: pd.Series, answer: str) -> pd.Series:
+    """Check which responses to a question are a given answer.
+
+    Blank responses don't match any answer.
+    """
+    return (responses == answer).fillna(value=False).astype(bool)
+
+
+def rows_before(
+    form_df: pd.DataFrame,
+    column: str,
+    cutoff: datetime.date,
+) -> pd.DataFrame:
+    """Select the rows of a form with a timestamp before a date, in timestamp order.
+
+    Forms are normally already in timestamp order, so the cutoff can be found with
+    a binary search instead of converting and comparing every row's timestamp.
+    """
+    if not form_df[column].is_monotonic_increasing:
+        form_df = form_df.sort_values(column, kind="stable")
+    return form_df.iloc[: form_df[column].searchsorted(pd.Timestamp(cutoff))]
+
 
 def load_user_df(user_form_path: os.PathLike[str] | str) -> pd.DataFrame:
     """Load user Google Forms data into a usable pandas dataframe.
@@ -21,21 +210,20 @@ def load_user_df(user_form_path: os.PathLike[str] | str) -> pd.DataFrame:
         A data frame with column names adjusted to be more usable, and the
         power user column cast to a boolean instead of a string.
     """
-    user_df = pd.read_excel(user_form_path, engine="openpyxl")
-    user_df = user_df.rename(
+    user_df = read_form(
+        user_form_path,
         columns={
             "Completion time": "start_timestamp",
             "UWO.CA email address": "email",
-            "First name": "first_name",
             "Last name": "last_name",
             "PI last name": "pi_last_name",
             "Contract end date": "end_timestamp",
             "Do you need your account to be a Power User account": "power_user",
         },
+        string_columns=["email", "last_name", "pi_last_name", "power_user"],
     )
-    user_df = user_df.map(lambda x: x.strip().lower() if isinstance(x, str) else x)
     user_df = user_df.assign(
-        power_user=user_df["power_user"] == "yes",
+        power_user=answered(user_df["power_user"], "yes"),
     )
     return user_df
 
@@ -53,28 +241,22 @@ def load_user_update_df(user_update_form_path: os.PathLike[str] | str) -> pd.Dat
     DataFrame
         Dataframe containing updates to user account specifications.
     """
-    user_update_df = pd.read_excel(user_update_form_path, engine="openpyxl")
-    user_update_df = user_update_df.rename(
+    user_update_df = read_form(
+        user_update_form_path,
         columns={
             "Completion time": "timestamp",
             "UWO.CA email address": "email",
-            "First name": "first_name",
             "Last name": "last_name",
             "PI Last name (e.g., Smith)": "pi_last_name",
-            ("Request access to additional datashare "): "additional_datashare",
             ("Update contract end date"): "new_end_timestamp",
             "Change account type": "new_power_user",
-            "List projects for which you need security access": "new_projects",
-            ("Consent"): "agree",
-            "Please feel free to leave any feedback": "feedback",
         },
+        string_columns=["email", "last_name", "pi_last_name", "new_power_user"],
     )
-    user_update_df = user_update_df.map(lambda x: x.strip().lower() if isinstance(x, str) else x)
     user_update_df = user_update_df.assign(
-        agree=user_update_df["agree"] == "yes",
-        new_power_user=user_update_df["new_power_user"].map(
-            lambda x: None if pd.isna(x) else x == "power user",
-        ),
+        new_power_user=user_update_df["new_power_user"]
+        .eq("power user")
+        .astype("boolean"),
     )
     return user_update_df
 
@@ -87,12 +269,11 @@ def load_pi_df(pi_form_path: os.PathLike[str] | str) -> pd.DataFrame:
     pi_form_path
         Path to the PI form.
     """
-    pi_df = pd.read_excel(pi_form_path, engine="openpyxl")
-    pi_df = pi_df.rename(
+    pi_df = read_form(
+        pi_form_path,
         columns={
             "Completion time": "start_timestamp",
             "UWO email address": "email",
-            "First Name": "first_name",
             "Last Name": "last_name",
             (
                 "Would you like your account to be a power user account?"
@@ -100,10 +281,10 @@ def load_pi_df(pi_form_path: os.PathLike[str] | str) -> pd.DataFrame:
             "Speed code": "speed_code",
             "Required storage needs (in TB)": "storage",
         },
+        string_columns=["email", "last_name", "pi_is_power_user", "speed_code"],
     )
-    pi_df = pi_df.map(lambda x: x.strip().lower() if isinstance(x, str) else x)
     pi_df = pi_df.assign(
-        pi_is_power_user=pi_df["pi_is_power_user"] == "yes",
+        pi_is_power_user=answered(pi_df["pi_is_power_user"], "yes"),
     )
     return pi_df
 
@@ -123,24 +304,19 @@ def load_storage_update_df(
     DataFrame
         Dataframe containing updates to PI storage needs.
     """
-    storage_update_df = pd.read_excel(storage_update_form_path, engine="openpyxl")
-    storage_update_df = storage_update_df.rename(
+    storage_update_df = read_form(
+        storage_update_form_path,
         columns={
             "Completion time": "timestamp",
             "UWO.CA email address": "email",
-            "First name": "first_name",
             "Last name": "last_name",
             ("Additional storage needs (in TB)"): "new_storage",
             "New speed code": "speed_code",
-            ("New secure project spaces names"): "access_groups",
-            ("Consent"): "agree",
-            "Please feel free to leave any feedback": "feedback",
             "Account closure2": "account_closed",
         },
+        string_columns=["email", "last_name", "speed_code", "account_closed"],
     )
-    storage_update_df = storage_update_df.map(lambda x: x.strip().lower() if isinstance(x, str) else x)
     storage_update_df = storage_update_df.assign(
-        agree=storage_update_df["agree"] == "yes",
-        account_closed=storage_update_df["account_closed"] == "yes",
+        account_closed=answered(storage_update_df["account_closed"], "yes"),
     )
     return storage_update_df
@@ -3,13 +3,17 @@
 from __future__ import annotations
 
 import datetime
+import itertools
+import sys
 from collections.abc import Iterable
 from typing import NamedTuple
 
 import pandas as pd
-from attrs import Attribute, define, evolve, field
+from attrs import Attribute, Factory, define, evolve, field
 from typing_extensions import Self
 
+from cbsserverbilling.dateutils import Timeline
+from cbsserverbilling.spreadsheet.io import rows_before
 from cbsserverbilling.spreadsheet.user import AccountRequest, AccountUpdate
 
 
@@ -33,7 +37,7 @@ def _both_defined(
         raise InvalidProjectError(instance, "speed code")
 
 
-@define(frozen=True)
+@define(frozen=True, cache_hash=True)
 class Project:
     """One project."""
 
@@ -46,6 +50,28 @@ class Project:
         default=frozenset(),
         validator=[_both_defined],
     )
+    storage_timeline: Timeline[float] = field(
+        init=False,
+        eq=False,
+        repr=False,
+        default=Factory(
+            lambda self: Timeline.from_increments(
+                (update.date, update.additional_storage) for update in self.updates
+            ),
+            takes_self=True,
+        ),
+    )
+    speed_code_timeline: Timeline[str] = field(
+        init=False,
+        eq=False,
+        repr=False,
+        default=Factory(
+            lambda self: Timeline.from_changes(
+                (update.date, update.speed_code or None) for update in self.updates
+            ),
+            takes_self=True,
+        ),
+    )
 
     def is_active(self, date: datetime.date) -> bool:
         """Check if the project was active on a date."""
@@ -61,19 +87,15 @@ class Project:
     def get_storage(self, date: datetime.date) -> float:
         """Check a project's storage on this date."""
         self.check_valid_date(date)
-        return sum(
-            update.additional_storage
-            for update in self.updates
-            if (update.date <= date) and update.additional_storage
-        )
+        return self.storage_timeline.get(date) or 0
 
     def get_speed_code(self, date: datetime.date) -> str:
         """Check a project's speed code on this date."""
         self.check_valid_date(date)
-        return max(  # type: ignore[reportGeneralTypeIssues]
-            (update for update in self.updates if update.speed_code),
-            key=lambda update: update.date,
-        ).speed_code
+        speed_code = self.speed_code_timeline.get(date)
+        if speed_code is None:
+            raise InvalidProjectError(self, "speed code")
+        return speed_code
 
 
 class NewPiTuple(NamedTuple):
@@ -103,7 +125,7 @@ class NewPiRequest:
         """Generate a request from a pandas tuple."""
         return cls(
             timestamp=tuple_.start_timestamp.to_pydatetime(),
-            name=str(tuple_.last_name),
+            name=sys.intern(str(tuple_.last_name)),
             email=str(tuple_.email),
             speed_code=str(tuple_.speed_code),
             power_user=bool(tuple_.pi_is_power_user),
@@ -169,7 +191,7 @@ class PiUpdate:
         """Generate an update from a pandas tuple."""
         return cls(
             timestamp=tuple_.timestamp.to_pydatetime(),
-            name=str(tuple_.last_name),
+            name=sys.intern(str(tuple_.last_name)),
             email=str(tuple_.email),
             speed_code=str(tuple_.speed_code) if pd.notna(tuple_.speed_code) else None,
             additional_storage=float(tuple_.new_storage)
@@ -235,36 +257,46 @@ def gen_all_projects(
     end_date: datetime.date,
 ) -> tuple[list[Project], Iterable[AccountRequest | AccountUpdate]]:
     """Generate all projects defined in a period."""
-    changes = [
-        NewPiRequest.from_pd_tuple(tuple_)
-        for tuple_ in pi_df.loc[
-            pi_df["start_timestamp"].dt.date <= end_date,
-            [
-                "start_timestamp",
-                "email",
-                "last_name",
-                "speed_code",
-                "storage",
-                "pi_is_power_user",
-            ],
-        ].itertuples()
-    ] + [
-        PiUpdate.from_pd_tuple(tuple_)
-        for tuple_ in pi_update_df.loc[
-            pi_update_df["timestamp"].dt.date <= end_date,
-            [
-                "timestamp",
-                "email",
-                "last_name",
-                "speed_code",
-                "new_storage",
-                "account_closed",
-            ],
-        ].itertuples()
-    ]
-    projects: list[Project] = []
-    for change in sorted(changes, key=lambda change: change.timestamp):
-        projects = change.handle(projects)
+    day_after_end = end_date + datetime.timedelta(days=1)
+    changes = sorted(
+        itertools.chain(
+            (
+                NewPiRequest.from_pd_tuple(tuple_)
+                for tuple_ in rows_before(pi_df, "start_timestamp", day_after_end).loc[
+                    :,
+                    [
+                        "start_timestamp",
+                        "email",
+                        "last_name",
+                        "speed_code",
+                        "storage",
+                        "pi_is_power_user",
+                    ],
+                ].itertuples()
+            ),
+            (
+                PiUpdate.from_pd_tuple(tuple_)
+                for tuple_ in rows_before(pi_update_df, "timestamp", day_after_end).loc[
+                    :,
+                    [
+                        "timestamp",
+                        "email",
+                        "last_name",
+                        "speed_code",
+                        "new_storage",
+                        "account_closed",
+                    ],
+                ].itertuples()
+            ),
+        ),
+        key=lambda change: change.timestamp,
+    )
+    # Changes only ever touch projects with their PI's name, so each one only needs
+    # to see those projects
+    projects_by_pi: dict[str, list[Project]] = {}
+    for change in changes:
+        projects_by_pi[change.name] = change.handle(projects_by_pi.get(change.name, []))
+    projects = list(itertools.chain.from_iterable(projects_by_pi.values()))
 
     user_changes = [
         update for change in changes if (update := change.gen_user_request())
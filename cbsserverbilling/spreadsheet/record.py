@@ -7,9 +7,8 @@ import logging
 from collections.abc import Iterable
 
 import pandas as pd
-from attrs import define
+from attrs import define, field
 
-from cbsserverbilling.dateutils import get_days_in_range
 from cbsserverbilling.records import BillableProjectRecord, User
 from cbsserverbilling.spreadsheet.project import Project, gen_all_projects
 from cbsserverbilling.spreadsheet.user import (
@@ -24,11 +23,22 @@ logging.basicConfig(level=logging.INFO)
 
 @define
 class SpreadsheetBillableProjectRecord(BillableProjectRecord):
-    """Billable project record derived from a set of spreadsheets."""
+    """Billable project record derived from a set of spreadsheets.
+
+    `users` only needs to include the users who had this project's PI at some
+    point in the period the record covers.
+    """
 
     users: Iterable[UpdateUser]
     has_power_users: bool
     project: Project
+    # Power users by period, shared by the summary and the bill
+    _power_users_cache: dict[tuple[datetime.date, datetime.date], list[User]] = field(
+        init=False,
+        factory=dict,
+        eq=False,
+        repr=False,
+    )
 
     def get_pi_last_name(self) -> str:
         """Get the project PI's last name."""
@@ -86,17 +96,10 @@ class SpreadsheetBillableProjectRecord(BillableProjectRecord):
         end_date
             Last date to consider.
         """
-        days = get_days_in_range(start_date, end_date)
         return [
             user
             for user in self.users
-            if any(
-                (
-                    user.is_active(date)
-                    and (user.get_pi_name(date) == self.project.pi_last_name)
-                )
-                for date in days
-            )
+            if self.project.pi_last_name in user.pi_names_in_range(start_date, end_date)
         ]
 
     def enumerate_power_users(
@@ -106,6 +109,9 @@ class SpreadsheetBillableProjectRecord(BillableProjectRecord):
     ) -> Iterable[User]:
         """Generate a list of power users associated with this PI.
 
+        The result is cached on the record, so the summary and the bill for a
+        period only look up the power users once.
+
         Parameters
         ----------
         start_date
@@ -115,19 +121,17 @@ class SpreadsheetBillableProjectRecord(BillableProjectRecord):
         """
         if not self.has_power_users:
             return []
-        days = get_days_in_range(start_date, end_date)
-        return [
-            user
-            for user in self.users
-            if any(
-                (
-                    user.is_active(date)
-                    and (user.get_pi_name(date) == self.project.pi_last_name)
-                    and user.is_power_user(date)
+        if (start_date, end_date) not in self._power_users_cache:
+            # Only the stretches a user was an active power user need their PI checked
+            self._power_users_cache[(start_date, end_date)] = [
+                user
+                for user in self.users
+                if any(
+                    self.project.pi_last_name in user.pi_names_in_range(first, last)
+                    for first, last in user.get_power_user_ranges(start_date, end_date)
                 )
-                for date in days
-            )
-        ]
+            ]
+        return list(self._power_users_cache[(start_date, end_date)])
 
 
 def gen_all_project_records(  # noqa: PLR0913
@@ -167,6 +171,12 @@ def gen_all_project_records(  # noqa: PLR0913
 
     check_all_power_users(users, projects, start_date, end_date)
 
+    # Group the users by PI once, so each record only has to scan its own users
+    users_by_pi: dict[str, list[UpdateUser]] = {}
+    for user in users:
+        for pi_name in user.pi_names_in_range(start_date, end_date):
+            users_by_pi.setdefault(pi_name, []).append(user)
+
     used_pis = set()
     records = []
     for project in sorted(projects, key=lambda project: project.open_date):
@@ -174,7 +184,7 @@ def gen_all_project_records(  # noqa: PLR0913
         record = SpreadsheetBillableProjectRecord(
             project=project,
             has_power_users=has_power_users,
-            users=users,
+            users=users_by_pi.get(project.pi_last_name, []),
         )
         records.append(record)
         used_pis.add(project.pi_last_name)
@@ -182,22 +192,17 @@ def gen_all_project_records(  # noqa: PLR0913
 
 
 def check_all_power_users(
-    users: Iterable[User],
+    users: Iterable[UpdateUser],
     projects: Iterable[Project],
     start_date: datetime.date,
     end_date: datetime.date,
 ) -> None:
     """Ensure that all power users are associated with a project."""
-    days = get_days_in_range(start_date, end_date)
     all_pi_names = {project.pi_last_name for project in projects}
     for user in users:
         if any(
-            (
-                user.is_active(date)
-                and (user.get_pi_name(date) not in all_pi_names)
-                and user.is_power_user(date)
-            )
-            for date in days
+            user.pi_names_in_range(first, last) - all_pi_names
+            for first, last in user.get_power_user_ranges(start_date, end_date)
         ):
             raise UnattachedUserError(user, start_date, end_date)
 
@@ -2,15 +2,20 @@
 
 from __future__ import annotations
 
+import bisect
 import datetime
+import itertools
+import sys
 from collections.abc import Iterable
 from typing import NamedTuple
 
 import pandas as pd
-from attrs import Attribute, define, evolve, field
+from attrs import Attribute, Factory, define, evolve, field
 from typing_extensions import Self
 
+from cbsserverbilling.dateutils import Timeline
 from cbsserverbilling.records import User
+from cbsserverbilling.spreadsheet.io import rows_before
 
 
 @define(frozen=True)
@@ -33,11 +38,33 @@ def _both_defined(
         raise InvalidUserError(instance, "pi_name")
 
 
-@define(frozen=True)
+@define(frozen=True, cache_hash=True)
 class UpdateUser(User):
     """A user with updates to handle its changes."""
 
     updates: frozenset[Update] = field(default=frozenset(), validator=[_both_defined])
+    power_user_timeline: Timeline[bool] = field(
+        init=False,
+        eq=False,
+        repr=False,
+        default=Factory(
+            lambda self: Timeline.from_changes(
+                (update.date, update.power_user) for update in self.updates
+            ),
+            takes_self=True,
+        ),
+    )
+    pi_name_timeline: Timeline[str] = field(
+        init=False,
+        eq=False,
+        repr=False,
+        default=Factory(
+            lambda self: Timeline.from_changes(
+                (update.date, update.pi_name) for update in self.updates
+            ),
+            takes_self=True,
+        ),
+    )
 
     def check_valid_date(self, date: datetime.date) -> None:
         """Check that the user was active on this date."""
@@ -47,26 +74,76 @@ class UpdateUser(User):
     def is_power_user(self, date: datetime.date) -> bool:
         """Check whether a user was a power user on this date."""
         self.check_valid_date(date)
-        return max(  # type: ignore[reportGeneralTypeIssues]
-            (
-                update
-                for update in self.updates
-                if (update.power_user is not None) and (update.date <= date)
-            ),
-            key=lambda update: update.date,
-        ).power_user
+        power_user = self.power_user_timeline.get(date)
+        if power_user is None:
+            raise InvalidUserError(self, "power_user")
+        return power_user
+
+    def get_power_user_ranges(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> list[tuple[datetime.date, datetime.date]]:
+        """Find when in a range of dates the user was an active power user.
+
+        This walks the changes in the power user timeline instead of every day.
+        """
+        first = max(start_date, self.start_date)
+        last = min(end_date, self.end_date) if self.end_date else end_date
+        if first > last:
+            return []
+        power_user = self.power_user_timeline.get(first)
+        if power_user is None:
+            raise InvalidUserError(self, "power_user")
+
+        ranges: list[tuple[datetime.date, datetime.date]] = []
+        range_start = first
+        for date, new_power_user in zip(
+            self.power_user_timeline.dates,
+            self.power_user_timeline.values,
+        ):
+            if date <= first or new_power_user == power_user:
+                continue
+            if date > last:
+                break
+            if power_user:
+                ranges.append((range_start, date - datetime.timedelta(days=1)))
+            range_start, power_user = date, new_power_user
+        if power_user:
+            ranges.append((range_start, last))
+        return ranges
+
+    def pi_names_in_range(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> set[str]:
+        """Find every PI the user had while active in a range of dates.
+
+        This walks the changes in the PI name timeline instead of every day.
+        """
+        first = max(start_date, self.start_date)
+        last = min(end_date, self.end_date) if self.end_date else end_date
+        if first > last:
+            return set()
+        pi_name = self.pi_name_timeline.get(first)
+        if pi_name is None:
+            raise InvalidUserError(self, "pi_name")
+
+        dates = self.pi_name_timeline.dates
+        return {pi_name}.union(
+            self.pi_name_timeline.values[
+                bisect.bisect_right(dates, first) : bisect.bisect_right(dates, last)
+            ],
+        )
 
     def get_pi_name(self, date: datetime.date) -> str:
         """Check a user's PI on this date."""
         self.check_valid_date(date)
-        return max(  # type: ignore[reportGeneralTypeIssues]
-            (
-                update
-                for update in self.updates
-                if (update.pi_name is not None) and (update.date <= date)
-            ),
-            key=lambda update: update.date,
-        ).pi_name
+        pi_name = self.pi_name_timeline.get(date)
+        if pi_name is None:
+            raise InvalidUserError(self, "pi_name")
+        return pi_name
 
 
 class AccountRequestTuple(NamedTuple):
@@ -98,7 +175,7 @@ class AccountRequest:
             timestamp=tuple_.start_timestamp.to_pydatetime(),
             name=str(tuple_.last_name),
             email=str(tuple_.email),
-            pi_name=str(tuple_.pi_last_name),
+            pi_name=sys.intern(str(tuple_.pi_last_name)),
             power_user=bool(tuple_.power_user),
             end_date=tuple_.end_timestamp.to_pydatetime().date()
             if pd.notna(tuple_.end_timestamp)
@@ -178,7 +255,9 @@ class AccountUpdate:
             timestamp=tuple_.timestamp.to_pydatetime(),
             name=str(tuple_.last_name),
             email=str(tuple_.email),
-            pi_name=str(tuple_.pi_last_name) if pd.notna(tuple_.pi_last_name) else None,
+            pi_name=sys.intern(str(tuple_.pi_last_name))
+            if pd.notna(tuple_.pi_last_name)
+            else None,
             power_user=bool(tuple_.new_power_user)
             if pd.notna(tuple_.new_power_user)
             else None,
@@ -272,8 +351,8 @@ def enumerate_all_users(
         range. The tuple contains the user's name, start date, and end
         date.
     """
-    user_df = power_user_df.loc[
-        power_user_df["start_timestamp"].dt.date < end_date,
+    user_df = rows_before(power_user_df, "start_timestamp", end_date).loc[
+        :,
         [
             "last_name",
             "start_timestamp",
@@ -283,8 +362,8 @@ def enumerate_all_users(
             "power_user",
         ],
     ]
-    update_df = power_user_update_df.loc[
-        power_user_update_df["timestamp"].dt.date < end_date,
+    update_df = rows_before(power_user_update_df, "timestamp", end_date).loc[
+        :,
         [
             "last_name",
             "timestamp",
@@ -293,26 +372,34 @@ def enumerate_all_users(
             "pi_last_name",
             "new_power_user",
         ],
-    ].assign(applied=False)
-
-    users = []
-    requests = [
-        AccountRequest.from_pd_tuple(tuple_)
-        for tuple_ in user_df.itertuples(name="AccountRequestTuple")
-    ]
-    updates = [
-        AccountUpdate.from_pd_tuple(tuple_)
-        for tuple_ in update_df.itertuples(name="AccountUpdateTuple")
     ]
+
     changes = sorted(
-        requests + updates + (list(additional_requests) if additional_requests else []),
+        itertools.chain(
+            (
+                AccountRequest.from_pd_tuple(tuple_)
+                for tuple_ in user_df.itertuples(name="AccountRequestTuple")
+            ),
+            (
+                AccountUpdate.from_pd_tuple(tuple_)
+                for tuple_ in update_df.itertuples(name="AccountUpdateTuple")
+            ),
+            additional_requests or (),
+        ),
         key=lambda change: change.timestamp,
     )
+    # Changes only ever touch users with their email, so each one only needs to see
+    # those users
+    users_by_email: dict[str, list[UpdateUser]] = {}
     for change in changes:
-        users = change.handle(users)
+        users_by_email[change.email] = change.handle(
+            users_by_email.get(change.email, []),
+        )
 
     return [
-        user for user in users if (not user.end_date) or (user.end_date > start_date)
+        user
+        for user in itertools.chain.from_iterable(users_by_email.values())
+        if (not user.end_date) or (user.end_date > start_date)
     ]
 
 
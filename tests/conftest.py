@@ -0,0 +1,70 @@
+"""Shared fixtures for the cbsserverbilling tests."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+RESOURCES = Path(__file__).parent / "resources"
+
+# The mock forms predate some renamed questions, so their headers are replaced
+# with the ones the loaders expect
+FORM_HEADERS = {
+    "pi": [
+        "Completion time",
+        "UWO email address",
+        "First Name",
+        "Last Name",
+        "Required storage needs (in TB)",
+        "Would you like your account to be a power user account?",
+        "Speed code",
+    ],
+    "storage_update": [
+        "Completion time",
+        "UWO.CA email address",
+        "First name",
+        "Last name",
+        "Additional storage needs (in TB)",
+        "New speed code",
+        "New secure project spaces names",
+        "Consent",
+        "Please feel free to leave any feedback",
+        "Account closure2",
+    ],
+    "user": [
+        "Completion time",
+        "UWO.CA email address",
+        "First name",
+        "Last name",
+        "PI last name",
+        "Contract end date",
+        "Do you need your account to be a Power User account",
+    ],
+    "user_update": [
+        "Completion time",
+        "UWO.CA email address",
+        "First name",
+        "Last name",
+        "PI Last name (e.g., Smith)",
+        "Request access to additional datashare ",
+        "Update contract end date",
+        "Change account type",
+        "List projects for which you need security access",
+        "Consent",
+        "Please feel free to leave any feedback",
+    ],
+}
+
+
+@pytest.fixture()
+def form_paths(tmp_path: Path) -> dict[str, Path]:
+    """Write copies of the mock forms with the current question headers."""
+    paths = {}
+    for form, headers in FORM_HEADERS.items():
+        form_df = pd.read_excel(RESOURCES / f"mock_{form}_form.xlsx")
+        form_df.columns = headers
+        paths[form] = tmp_path / f"{form}.xlsx"
+        form_df.to_excel(paths[form], index=False)
+    return paths
@@ -0,0 +1,97 @@
+"""Tests for cbsserverbilling.dateutils"""
+
+import datetime
+
+from cbsserverbilling.dateutils import (
+    Timeline,
+    count_days_in_ranges,
+    format_date,
+    get_days_in_range,
+    get_end_of_period,
+)
+
+
+def test_get_days_in_range():
+    """Test that `get_days_in_range` includes both ends of the range."""
+    days = get_days_in_range(datetime.date(2020, 12, 30), datetime.date(2021, 1, 2))
+    assert days == (
+        datetime.date(2020, 12, 30),
+        datetime.date(2020, 12, 31),
+        datetime.date(2021, 1, 1),
+        datetime.date(2021, 1, 2),
+    )
+    assert get_days_in_range(datetime.date(2021, 1, 2), datetime.date(2021, 1, 1)) == ()
+
+
+def test_count_days_in_ranges():
+    """Test that `count_days_in_ranges` only counts overlapping days once."""
+    assert count_days_in_ranges([]) == 0
+    assert (
+        count_days_in_ranges(
+            [
+                (datetime.date(2020, 11, 10), datetime.date(2020, 11, 20)),
+                (datetime.date(2020, 11, 1), datetime.date(2020, 11, 12)),
+                (datetime.date(2020, 11, 14), datetime.date(2020, 11, 15)),
+                (datetime.date(2020, 12, 1), datetime.date(2020, 12, 1)),
+            ],
+        )
+        == 21
+    )
+
+
+def test_get_end_of_period():
+    """Test that `get_end_of_period` handles year boundaries and leap years."""
+    assert get_end_of_period(2020, 11, 3) == datetime.date(2021, 1, 31)
+    assert get_end_of_period(2020, 11, 1) == datetime.date(2020, 11, 30)
+    assert get_end_of_period(2020, 1, 2) == datetime.date(2020, 2, 29)
+    assert get_end_of_period(2021, 1, 2) == datetime.date(2021, 2, 28)
+    assert get_end_of_period(2020, 1, 12) == datetime.date(2020, 12, 31)
+    assert get_end_of_period(2020, 3, 12) == datetime.date(2021, 2, 28)
+    assert get_end_of_period(2020, 11, 15) == datetime.date(2022, 1, 31)
+
+
+def test_format_date():
+    """Test that `format_date` matches the C locale's `strftime`."""
+    start, end = datetime.date(2020, 1, 1), datetime.date(2020, 12, 31)
+    for day in get_days_in_range(start, end):
+        assert format_date(day) == day.strftime("%b %d, %Y")
+
+
+def test_timeline_from_changes():
+    """Test that a `Timeline` gives the most recent value on each date."""
+    timeline = Timeline.from_changes(
+        [
+            (datetime.date(2020, 12, 1), "b"),
+            (datetime.date(2020, 11, 1), "a"),
+            (datetime.date(2020, 11, 15), None),
+        ],
+    )
+    assert timeline.get(datetime.date(2020, 10, 31)) is None
+    assert timeline.get(datetime.date(2020, 11, 1)) == "a"
+    assert timeline.get(datetime.date(2020, 11, 30)) == "a"
+    assert timeline.get(datetime.date(2020, 12, 1)) == "b"
+
+
+def test_timeline_from_increments():
+    """Test that a running total `Timeline` adds up increments to each date."""
+    timeline = Timeline.from_increments(
+        [
+            (datetime.date(2020, 11, 1), 10),
+            (datetime.date(2020, 12, 1), 5),
+            (datetime.date(2020, 12, 1), 1),
+            (datetime.date(2020, 11, 15), None),
+        ],
+    )
+    assert timeline.get(datetime.date(2020, 10, 31)) is None
+    assert timeline.get(datetime.date(2020, 11, 20)) == 10
+    assert timeline.get(datetime.date(2021, 1, 1)) == 16
+
+
+def test_timeline_constructors_keep_subclass():
+    """Test that `Timeline`'s constructors build instances of subclasses."""
+
+    class StorageTimeline(Timeline[float]):
+        pass
+
+    assert isinstance(StorageTimeline.from_changes([]), StorageTimeline)
+    assert isinstance(StorageTimeline.from_increments([]), StorageTimeline)
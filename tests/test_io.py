@@ -0,0 +1,208 @@
+"""Tests for cbsserverbilling.spreadsheet.io"""
+
+from __future__ import annotations
+
+import datetime
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from cbsserverbilling.spreadsheet import io
+from cbsserverbilling.spreadsheet.io import (
+    load_pi_df,
+    load_user_update_df,
+    rows_before,
+)
+
+
+@pytest.fixture()
+def disk_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """Enable the disk cache in a temporary directory."""
+    cache_dir = tmp_path / "cache" / "cbsserverbilling"
+    monkeypatch.setenv(io.DISK_CACHE_VARIABLE, "1")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    io._read_excel_cached.cache_clear()
+    yield cache_dir
+    io._read_excel_cached.cache_clear()
+
+
+@pytest.fixture()
+def excel_reads(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Record every excel sheet that is actually parsed."""
+    reads: list[str] = []
+    read_excel = pd.read_excel
+
+    def recording_read_excel(path, *args, **kwargs):
+        reads.append(path)
+        return read_excel(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_excel", recording_read_excel)
+    return reads
+
+
+def test_load_user_update_df_skips_unused_columns(
+    form_paths: dict[str, Path],
+    tmp_path: Path,
+):
+    """Test that columns the billing doesn't read can be missing from a form."""
+    form_df = pd.read_excel(form_paths["user_update"]).drop(
+        columns=["Please feel free to leave any feedback", "Consent"],
+    )
+    form_path = tmp_path / "trimmed_user_update.xlsx"
+    form_df.to_excel(form_path, index=False)
+
+    user_update_df = load_user_update_df(form_path)
+    assert list(user_update_df.columns) == [
+        "timestamp",
+        "email",
+        "last_name",
+        "pi_last_name",
+        "new_end_timestamp",
+        "new_power_user",
+    ]
+    assert len(user_update_df.index) == len(form_df.index)
+
+
+def test_disk_cache_is_opt_in(
+    form_paths: dict[str, Path],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that forms aren't written to disk unless the cache is enabled."""
+    monkeypatch.delenv(io.DISK_CACHE_VARIABLE, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    def missing_home() -> Path:
+        msg = "Could not determine home directory."
+        raise RuntimeError(msg)
+
+    # Without the disk cache, the home directory is never looked up
+    monkeypatch.setattr(Path, "home", missing_home)
+    io._read_excel_cached.cache_clear()
+    load_pi_df(form_paths["pi"])
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    io._read_excel_cached.cache_clear()
+    load_pi_df(form_paths["pi"])
+    assert not (tmp_path / "cache").exists()
+
+
+def test_get_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that the cache directory falls back to the home directory, if any."""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    monkeypatch.setenv("XDG_CACHE_HOME", "")
+    assert io._get_cache_dir() == tmp_path / ".cache" / "cbsserverbilling"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assert io._get_cache_dir() == tmp_path / "xdg" / "cbsserverbilling"
+
+    def missing_home() -> Path:
+        msg = "Could not determine home directory."
+        raise RuntimeError(msg)
+
+    monkeypatch.setattr(Path, "home", missing_home)
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert io._get_cache_dir() is None
+
+
+def test_disk_cache_hit(
+    form_paths: dict[str, Path],
+    disk_cache: Path,
+    excel_reads: list[str],
+):
+    """Test that an unchanged form is loaded from the disk cache."""
+    pi_df = load_pi_df(form_paths["pi"])
+    assert len(list(disk_cache.glob("*.pkl"))) == 1
+    assert oct(disk_cache.stat().st_mode & 0o777) == oct(0o700)
+
+    io._read_excel_cached.cache_clear()
+    pd.testing.assert_frame_equal(load_pi_df(form_paths["pi"]), pi_df)
+    assert excel_reads == [str(form_paths["pi"])]
+
+
+def test_disk_cache_invalidation(
+    form_paths: dict[str, Path],
+    disk_cache: Path,
+    excel_reads: list[str],
+):
+    """Test that changing a form's mtime or size invalidates its cache entry."""
+    form_path = form_paths["pi"]
+    load_pi_df(form_path)
+
+    form_stat = form_path.stat()
+    os.utime(form_path, ns=(form_stat.st_atime_ns, form_stat.st_mtime_ns + 10**9))
+    io._read_excel_cached.cache_clear()
+    load_pi_df(form_path)
+    assert len(excel_reads) == 2
+
+    # Rewrite the form with one response fewer, but keep the same mtime
+    form_stat = form_path.stat()
+    form_df = pd.read_excel(form_path).iloc[:-1]
+    form_df.to_excel(form_path, index=False)
+    os.utime(form_path, ns=(form_stat.st_atime_ns, form_stat.st_mtime_ns))
+    assert form_path.stat().st_size != form_stat.st_size
+    io._read_excel_cached.cache_clear()
+    assert len(load_pi_df(form_path).index) == len(form_df.index)
+    assert len(excel_reads) == 4
+
+
+def test_disk_cache_corrupt_entry(
+    form_paths: dict[str, Path],
+    disk_cache: Path,
+    excel_reads: list[str],
+):
+    """Test that a corrupt cache entry falls back to parsing the form."""
+    pi_df = load_pi_df(form_paths["pi"])
+    (cache_file,) = disk_cache.glob("*.pkl")
+    cache_file.write_bytes(b"not a pickle")
+
+    io._read_excel_cached.cache_clear()
+    pd.testing.assert_frame_equal(load_pi_df(form_paths["pi"]), pi_df)
+    assert len(excel_reads) == 2
+
+
+def test_disk_cache_ignores_writable_entry(
+    form_paths: dict[str, Path],
+    disk_cache: Path,
+    excel_reads: list[str],
+):
+    """Test that a cache entry others could have written isn't unpickled."""
+    load_pi_df(form_paths["pi"])
+    (cache_file,) = disk_cache.glob("*.pkl")
+    cache_file.chmod(0o666)
+
+    io._read_excel_cached.cache_clear()
+    load_pi_df(form_paths["pi"])
+    assert len(excel_reads) == 2
+
+
+def test_rows_before():
+    """Test that `rows_before` keeps rows dated before the cutoff, in order."""
+    form_df = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(
+                [
+                    "2021-01-31 23:59:59",
+                    "2020-11-01 00:00:00",
+                    "2021-02-01 00:00:00",
+                    "2020-10-31 12:00:00",
+                    "2021-02-01 09:30:00",
+                ],
+            ),
+            "email": ["a", "b", "c", "d", "e"],
+        },
+    )
+    for cutoff in [
+        datetime.date(2020, 11, 1),
+        datetime.date(2021, 2, 1),
+        datetime.date(2020, 1, 1),
+    ]:
+        pd.testing.assert_frame_equal(
+            rows_before(form_df, "timestamp", cutoff),
+            form_df[form_df["timestamp"].dt.date < cutoff].sort_values("timestamp"),
+        )
+        pd.testing.assert_frame_equal(
+            rows_before(form_df.sort_values("timestamp"), "timestamp", cutoff),
+            form_df[form_df["timestamp"].dt.date < cutoff].sort_values("timestamp"),
+        )
@@ -0,0 +1,74 @@
+"""Tests for cbsserverbilling.main"""
+
+from __future__ import annotations
+
+import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from cbsserverbilling.main import gen_parser, process_everything
+
+ARGS = ["pi.xlsx", "pi_update.xlsx", "user.xlsx", "user_update.xlsx", "2020-08-01"]
+
+
+def test_parser_rejects_negative_jobs():
+    """Test that `--jobs` can't be negative."""
+    assert gen_parser().parse_args([*ARGS, "out", "--jobs", "0"]).jobs == 0
+    with pytest.raises(SystemExit):
+        gen_parser().parse_args([*ARGS, "out", "--jobs", "-1"])
+
+
+def test_process_everything_jobs(form_paths: dict[str, Path], tmp_path: Path):
+    """Test that generating bills in parallel gives the same files as serially."""
+    out_dirs = {}
+    for jobs in [1, 2]:
+        out_dirs[jobs] = tmp_path / f"jobs-{jobs}"
+        out_dirs[jobs].mkdir()
+        process_everything(
+            form_paths["pi"],
+            form_paths["user"],
+            form_paths["user_update"],
+            form_paths["storage_update"],
+            datetime.date(2020, 8, 1),
+            out_dirs[jobs],
+            jobs=jobs,
+        )
+
+    serial_files = sorted(path.name for path in out_dirs[1].iterdir())
+    assert serial_files == sorted(path.name for path in out_dirs[2].iterdir())
+    assert any(name.endswith("_bill.tex") for name in serial_files)
+    for name in serial_files:
+        if name.endswith(".tex"):
+            assert (out_dirs[1] / name).read_text() == (out_dirs[2] / name).read_text()
+        else:
+            pd.testing.assert_frame_equal(
+                pd.read_excel(out_dirs[1] / name),
+                pd.read_excel(out_dirs[2] / name),
+            )
+
+
+def test_process_everything_csv_summary(form_paths: dict[str, Path], tmp_path: Path):
+    """Test that the summary can be saved as a CSV file."""
+    kwargs = {
+        "pi_form": form_paths["pi"],
+        "user_form": form_paths["user"],
+        "user_update_form": form_paths["user_update"],
+        "pi_update_form": form_paths["storage_update"],
+        "quarter_start": datetime.date(2020, 8, 1),
+    }
+    (tmp_path / "xlsx").mkdir()
+    (tmp_path / "csv").mkdir()
+    process_everything(**kwargs, out_dir=tmp_path / "xlsx")
+    process_everything(**kwargs, out_dir=tmp_path / "csv", summary_format="csv")
+
+    assert not list((tmp_path / "csv").glob("*.xlsx"))
+    summary_df = pd.read_csv(tmp_path / "csv" / "summary_2020-08-01.csv")
+    assert not summary_df.empty
+    pd.testing.assert_frame_equal(
+        summary_df,
+        pd.read_excel(tmp_path / "xlsx" / "summary_2020-08-01.xlsx"),
+        # Excel stores whole numbers of terabytes as integers
+        check_dtype=False,
+    )
@@ -0,0 +1,121 @@
+"""Tests for cbsserverbilling.spreadsheet.user"""
+
+from __future__ import annotations
+
+import datetime
+
+import pytest
+
+from cbsserverbilling.dateutils import get_days_in_range
+from cbsserverbilling.spreadsheet.user import Update, UpdateUser
+
+QUARTER_START = datetime.date(2020, 11, 1)
+QUARTER_END = datetime.date(2021, 1, 31)
+
+USERS = {
+    "pi change mid-quarter": UpdateUser(
+        name="apricot",
+        email="aapricot@example.com",
+        start_date=datetime.date(2020, 6, 1),
+        updates=frozenset(
+            {
+                Update(datetime.date(2020, 6, 1), power_user=True, pi_name="apple"),
+                Update(datetime.date(2020, 12, 10), pi_name="banana"),
+            },
+        ),
+    ),
+    "power user toggled in quarter": UpdateUser(
+        name="blueberry",
+        email="bblueberry@example.com",
+        start_date=datetime.date(2020, 6, 1),
+        updates=frozenset(
+            {
+                Update(datetime.date(2020, 6, 1), power_user=True, pi_name="apple"),
+                Update(datetime.date(2020, 11, 15), power_user=False),
+                Update(datetime.date(2021, 1, 5), power_user=True),
+            },
+        ),
+    ),
+    "updates on quarter boundaries": UpdateUser(
+        name="cranberry",
+        email="ccranberry@example.com",
+        start_date=datetime.date(2020, 10, 31),
+        updates=frozenset(
+            {
+                Update(datetime.date(2020, 10, 31), power_user=False, pi_name="apple"),
+                Update(datetime.date(2020, 11, 1), power_user=True, pi_name="banana"),
+                Update(datetime.date(2021, 1, 31), power_user=False, pi_name="cherry"),
+                Update(datetime.date(2021, 2, 1), power_user=True, pi_name="durian"),
+            },
+        ),
+    ),
+    "ended before quarter": UpdateUser(
+        name="date",
+        email="ddate@example.com",
+        start_date=datetime.date(2019, 1, 1),
+        end_date=datetime.date(2020, 10, 31),
+        updates=frozenset(
+            {Update(datetime.date(2019, 1, 1), power_user=True, pi_name="apple")},
+        ),
+    ),
+    "starts after quarter": UpdateUser(
+        name="elderberry",
+        email="eelderberry@example.com",
+        start_date=datetime.date(2021, 2, 1),
+        updates=frozenset(
+            {Update(datetime.date(2021, 2, 1), power_user=True, pi_name="apple")},
+        ),
+    ),
+    "active for part of quarter": UpdateUser(
+        name="fig",
+        email="ffig@example.com",
+        start_date=datetime.date(2020, 11, 20),
+        end_date=datetime.date(2020, 12, 20),
+        updates=frozenset(
+            {
+                Update(datetime.date(2020, 11, 20), power_user=True, pi_name="apple"),
+                Update(datetime.date(2020, 12, 1), power_user=False, pi_name="banana"),
+            },
+        ),
+    ),
+}
+
+RANGES = [
+    (QUARTER_START, QUARTER_END),
+    (QUARTER_START, QUARTER_START),
+    (QUARTER_END, QUARTER_END),
+    (datetime.date(2020, 11, 15), datetime.date(2020, 12, 10)),
+    (datetime.date(2020, 12, 11), datetime.date(2021, 1, 4)),
+]
+
+
+@pytest.mark.parametrize("user", USERS.values(), ids=USERS.keys())
+@pytest.mark.parametrize("date_range", RANGES, ids=str)
+def test_get_power_user_ranges(
+    user: UpdateUser,
+    date_range: tuple[datetime.date, datetime.date],
+):
+    """Test that power user ranges cover the days a user was an active power user."""
+    ranges = user.get_power_user_ranges(*date_range)
+    assert ranges == sorted(ranges)
+    assert [
+        day for first, last in ranges for day in get_days_in_range(first, last)
+    ] == [
+        day
+        for day in get_days_in_range(*date_range)
+        if user.is_active(day) and user.is_power_user(day)
+    ]
+
+
+@pytest.mark.parametrize("user", USERS.values(), ids=USERS.keys())
+@pytest.mark.parametrize("date_range", RANGES, ids=str)
+def test_pi_names_in_range(
+    user: UpdateUser,
+    date_range: tuple[datetime.date, datetime.date],
+):
+    """Test that a user's PIs in a range are the ones they had on active days."""
+    assert user.pi_names_in_range(*date_range) == {
+        user.get_pi_name(day)
+        for day in get_days_in_range(*date_range)
+        if user.is_active(day)
+    }